@@ -5,14 +5,18 @@ import osmnx as ox
 from matplotlib.path import Path
 from matplotlib import pyplot as plt
 from matplotlib.patches import PathPatch
+from matplotlib.collections import PolyCollection
 
 # CV2 & Scipy & Numpy & Pandas
 import numpy as np
 from numpy.random import choice
 
 # Shapely
+import shapely
 from shapely.geometry import *
 from shapely.affinity import *
+from shapely.geometry.polygon import orient
+from shapely.geometry.base import BaseGeometry
 
 # Geopandas
 from geopandas import GeoDataFrame
@@ -20,23 +24,73 @@ from geopandas import GeoDataFrame
 # etc
 import re
 import pandas as pd
-from functools import reduce
-from tabulate import tabulate
-from IPython.display import Markdown, display
+from functools import reduce, lru_cache
 from collections.abc import Iterable
 
 # Fetch
 from .fetch import *
+from .fetch import _shapely2
+
+# OSM id queries (e.g. 'R123456')
+_OSMID_RE = re.compile(r'[A-Z][0-9]+')
 
 # Helper functions
 def get_hash(key):
-    return frozenset(key.items()) if type(key) == dict else key
+    if type(key) == dict:
+        return frozenset((k, get_hash(v)) for k, v in key.items())
+    elif type(key) in [list, tuple]:
+        return tuple(get_hash(x) for x in key)
+    elif isinstance(key, BaseGeometry):
+        return key.wkb
+    else:
+        return key
+
+# Geocoding & perimeter requests are memoized, so re-plotting the same query skips the Nominatim round-trip
+@lru_cache(maxsize = 128)
+def _cached_geocode(query):
+    return ox.geocode(query)
+
+@lru_cache(maxsize = 128)
+def _cached_perimeter(query, by_osmid = False):
+    return get_perimeter(query, by_osmid = by_osmid)
+
+# Fetched layers are memoized too, so restyling the same map (drawing_kwargs) skips the Overpass requests
+# (least recently used layers are evicted first)
+_layer_cache = {}
+
+def _cached_layer(layer, query, radius, base_kwargs, kwargs, cache = True):
+    if not cache:
+        return get_layer(layer, **base_kwargs, **kwargs)
+    try:
+        key = (layer, get_hash(query), radius, get_hash(kwargs))
+        hash(key)
+    except TypeError:
+        # Some kwarg can't be frozen into a key (e.g. a set or an array): don't cache
+        return get_layer(layer, **base_kwargs, **kwargs)
+    if key in _layer_cache:
+        _layer_cache[key] = _layer_cache.pop(key)
+    else:
+        if len(_layer_cache) >= 32:
+            _layer_cache.pop(next(iter(_layer_cache)))
+        _layer_cache[key] = get_layer(layer, **base_kwargs, **kwargs)
+    return _layer_cache[key]
+
+def clear_cache():
+    '''
+    Forget memoized requests & layers (e.g. after changing osmnx settings)
+    '''
+    _cached_geocode.cache_clear()
+    _cached_perimeter.cache_clear()
+    _layer_cache.clear()
 
 # Drawing functions
 def show_palette(palette, description = ''):
     '''
     Helper to display palette in Markdown
     '''
+    # Only needed here: imported lazily to keep 'import prettymaps' light
+    from tabulate import tabulate
+    from IPython.display import Markdown, display
 
     colorboxes = [
         f'![](https://placehold.it/30x30/{c[1:]}/{c[1:]}?text=)'
@@ -57,38 +111,97 @@ def get_patch(shape, **kwargs):
     else:
         return None
 
+def get_geometries_list(shape):
+    '''
+    Flatten (possibly nested) Python iterables into a flat list of shapely objects
+    '''
+    if isinstance(shape, BaseGeometry):
+        return [shape]
+    elif isinstance(shape, Iterable):
+        return [geometry for shape_ in shape for geometry in get_geometries_list(shape_)]
+    else:
+        return []
+
+def get_polygons(shape):
+    '''
+    Flatten (possibly nested) shapely object into a list of non-empty polygons
+    '''
+    if _shapely2:
+        parts = np.asarray(get_geometries_list(shape), dtype = object)
+        # Explode Multi* & GeometryCollections in GEOS until only primitive geometries are left
+        while np.isin(shapely.get_type_id(parts), [4, 5, 6, 7]).any():
+            parts = shapely.get_parts(parts)
+        return parts[(shapely.get_type_id(parts) == 3) & ~shapely.is_empty(parts)]
+    elif type(shape) == Polygon:
+        return [] if shape.is_empty else [shape]
+    elif hasattr(shape, 'geoms'):
+        return [polygon for shape_ in shape.geoms for polygon in get_polygons(shape_)]
+    elif isinstance(shape, Iterable):
+        return [polygon for shape_ in shape for polygon in get_polygons(shape_)]
+    else:
+        return []
+
+def get_ring_codes(n):
+    '''
+    Matplotlib path codes for a closed ring of n vertices
+    '''
+    codes = np.full(n, Path.LINETO, dtype = Path.code_type)
+    codes[0] = Path.MOVETO
+    codes[-1] = Path.CLOSEPOLY
+    return codes
+
+def get_collection(polygons, **kwargs):
+    '''
+    Convert list of shapely polygons (holes included) to a single matplotlib PolyCollection
+    '''
+    verts, codes = [], []
+    for polygon in polygons:
+        # Exterior counter-clockwise, interiors clockwise, so that holes are left unfilled
+        polygon = orient(polygon)
+        rings = [np.asarray(ring.coords)[:, :2] for ring in [polygon.exterior, *polygon.interiors]]
+        verts.append(np.concatenate(rings))
+        codes.append(np.concatenate([get_ring_codes(len(ring)) for ring in rings]))
+
+    # 'fill' is a Patch property, emulate it with a transparent facecolor
+    if not kwargs.pop('fill', True):
+        kwargs['fc'] = 'none'
+
+    collection = PolyCollection([], **kwargs)
+    collection.set_verts_and_codes(verts, codes)
+    return collection
+
 # Plot a single shape
 def plot_shape(shape, ax, vsketch = None, **kwargs):
     '''
     Plot shapely object
     '''
-    if isinstance(shape, Iterable) and type(shape) != MultiLineString:
+    if vsketch is None:
+        polygons = get_polygons(shape)
+        if len(polygons) > 0:
+            ax.add_collection(get_collection(polygons, **kwargs))
+    elif isinstance(shape, Iterable) and type(shape) != MultiLineString:
         for shape_ in shape:
             plot_shape(shape_, ax, vsketch = vsketch, **kwargs)
     else:
         if not shape.is_empty:
+            if ('draw' not in kwargs) or kwargs['draw']:
 
-            if vsketch is None:
-                ax.add_patch(PolygonPatch(shape, **kwargs))
-            else:
-                if ('draw' not in kwargs) or kwargs['draw']:
-
-                    if 'stroke' in kwargs:
-                        vsketch.stroke(kwargs['stroke'])
-                    else:
-                        vsketch.stroke(1)
+                if 'stroke' in kwargs:
+                    vsketch.stroke(kwargs['stroke'])
+                else:
+                    vsketch.stroke(1)
 
-                    if 'penWidth' in kwargs:
-                        vsketch.penWidth(kwargs['penWidth'])
-                    else:
-                        vsketch.penWidth(0.3)
+                if 'penWidth' in kwargs:
+                    vsketch.penWidth(kwargs['penWidth'])
+                else:
+                    vsketch.penWidth(0.3)
 
-                    if 'fill' in kwargs:
-                        vsketch.fill(kwargs['fill'])
-                    else:
-                        vsketch.noFill()
+                if 'fill' in kwargs:
+                    vsketch.fill(kwargs['fill'])
+                else:
+                    vsketch.noFill()
 
-                    vsketch.geometry(shape)
+                vsketch.geometry(shape)
 
 # Plot a collection of shapes
 def plot_shapes(shapes, ax, vsketch = None, palette = None, **kwargs):
@@ -98,11 +211,37 @@ def plot_shapes(shapes, ax, vsketch = None, palette = None, **kwargs):
     if not isinstance(shapes, Iterable):
         shapes = [shapes]
 
-    for shape in shapes:
-        if palette is None:
-            plot_shape(shape, ax, vsketch = vsketch, **kwargs)
-        else:
-            plot_shape(shape, ax, vsketch = vsketch, fc = choice(palette), **kwargs)
+    if vsketch is None:
+        # Draw all polygons at once, as a single matplotlib artist
+        polygons = get_polygons(shapes)
+        if len(polygons) == 0:
+            return
+        if palette is not None:
+            kwargs['fc'] = np.asarray(palette)[np.random.randint(0, len(palette), size = len(polygons))]
+        ax.add_collection(get_collection(polygons, **kwargs))
+    else:
+        for shape in shapes:
+            if palette is None:
+                plot_shape(shape, ax, vsketch = vsketch, **kwargs)
+            else:
+                plot_shape(shape, ax, vsketch = vsketch, fc = choice(palette), **kwargs)
+
+# Split a layer's drawing kwargs into the plot_shapes calls needed to draw it
+def get_drawing_passes(kwargs, vsketch = None):
+    if 'hatch_c' not in kwargs:
+        # Draw shape normally
+        return [kwargs]
+    hatched = {'lw': 0, 'ec': kwargs['hatch_c'], **{k:v for k,v in kwargs.items() if k not in ['lw', 'ec', 'hatch_c']}}
+    if (vsketch is None) and ('lw' in kwargs) and (kwargs['lw'] == 0):
+        # No contour to draw: the hatched shape is all there is
+        return [hatched]
+    else:
+        return [
+            # Draw hatched shape
+            hatched,
+            # Draw shape contour only
+            {'fill': False, **{k:v for k,v in kwargs.items() if k not in ['hatch_c', 'hatch', 'fill']}}
+        ]
 
 # Parse query (by coordinates, OSMId or name)
 def parse_query(query):
@@ -110,24 +249,74 @@ def parse_query(query):
         return 'polygon'
     elif type(query) == tuple:
         return 'coordinates'
-    elif re.match('''[A-Z][0-9]+''', query):
+    elif _OSMID_RE.match(query):
         return 'osmid'
     else:
         return 'address'
 
+# Bounding box (xmin, ymin, xmax, ymax) of a shapely object
+def get_bounds(geometry):
+    return shapely.bounds(geometry) if _shapely2 else geometry.bounds
+
+# Homogeneous 2D translation matrix
+def get_translation_matrix(dx, dy):
+    return np.array([
+        [1, 0, dx],
+        [0, 1, dy],
+        [0, 0, 1]
+    ])
+
+# Centroid of a GeometryCollection or of an array of geometries (taken as a whole)
+def get_centroid(geometries):
+    if isinstance(geometries, np.ndarray):
+        # Area-weighted mean of each geometry's centroid, as GEOS computes it for collections
+        areas = shapely.area(geometries)
+        if areas.sum() > 0:
+            centroids = shapely.get_coordinates(shapely.centroid(geometries[areas > 0]))
+            return tuple(np.average(centroids, weights = areas[areas > 0], axis = 0))
+        geometries = GeometryCollection(list(geometries))
+    return geometries.centroid.coords[0]
+
 # Apply transformation (translation & scale) to layers
 def transform(layers, x, y, scale_x, scale_y, rotation):
-    # Transform layers (translate & scale)
+    translation = (x is not None) and (y is not None)
+    scale_x = 1 if scale_x is None else scale_x
+    scale_y = 1 if scale_y is None else scale_y
+    rotation = 0 if rotation is None else rotation
+    # Nothing to transform
+    if not translation and scale_x == 1 and scale_y == 1 and rotation == 0:
+        return layers
+
     k, v = zip(*layers.items())
-    v = GeometryCollection(v)
-    if (x is not None) and (y is not None):
-        v = translate(v, *(np.array([x, y]) - np.concatenate(v.centroid.xy)))
-    if scale_x is not None:
-        v = scale(v, scale_x, 1)
-    if scale_y is not None:
-        v = scale(v, 1, scale_y)
-    if rotation is not None:
-        v = rotate(v, rotation)
+    if _shapely2:
+        # Work on the array of layers directly (no GeometryCollection wrap & unwrap)
+        v = np.asarray(v, dtype = object)
+        xmin, ymin, xmax, ymax = shapely.total_bounds(v)
+    else:
+        v = GeometryCollection(v)
+        xmin, ymin, xmax, ymax = v.bounds
+
+    # Compose translation, scale & rotation into a single affine matrix
+    matrix = np.identity(3)
+    if translation:
+        cx, cy = get_centroid(v)
+        matrix = get_translation_matrix(x - cx, y - cy)
+    # Scale & rotate around the (translated) bounding box center, like shapely.affinity does
+    cx, cy, _ = np.matmul(matrix, [(xmin+xmax)/2, (ymin+ymax)/2, 1])
+    theta = np.radians(rotation)
+    matrix = np.linalg.multi_dot([
+        get_translation_matrix(cx, cy),
+        [[np.cos(theta), -np.sin(theta), 0], [np.sin(theta), np.cos(theta), 0], [0, 0, 1]],
+        np.diag([scale_x, scale_y, 1]),
+        get_translation_matrix(-cx, -cy),
+        matrix
+    ])
+    if _shapely2:
+        v = shapely.transform(v, lambda coords: np.column_stack([coords[:, :2] @ matrix[:2, :2].T + matrix[:2, 2], coords[:, 2:]]), include_z = True)
+    else:
+        (a, b, xoff), (d, e, yoff) = matrix[:2]
+        v = affine_transform(v, [a, b, d, e, xoff, yoff]).geoms
+
     layers = dict(zip(k, v))
     return layers
 
@@ -156,6 +345,8 @@ def plot(
     vsketch = None,
     # Transform (translation & scale) params
     x = None, y = None, scale_x = None, scale_y = None, rotation = None,
+    # Whether to reuse memoized requests & layers from previous calls (see clear_cache)
+    cache = True,
     ):
 
     # Interpret query
@@ -176,21 +367,33 @@ def plot(
     else:
         # Define base kwargs
         if radius:
+            if query_mode == 'coordinates':
+                point = query
+            else:
+                point = _cached_geocode(query) if cache else ox.geocode(query)
             base_kwargs = {
-                'point': query if query_mode == 'coordinates' else ox.geocode(query),
+                'point': point,
                 'radius': radius
             }
         else:
+            if query_mode == 'polygon':
+                perimeter = query
+            elif cache:
+                # Copy, so that callers never share the memoized GeoDataFrame
+                perimeter = _cached_perimeter(query, by_osmid = query_mode == 'osmid').copy()
+            else:
+                perimeter = get_perimeter(query, by_osmid = query_mode == 'osmid')
             base_kwargs = {
-                'perimeter': query if query_mode == 'polygon' else get_perimeter(query, by_osmid = query_mode == 'osmid')
+                'perimeter': perimeter
             }
 
         # Fetch layers
         layers = {
-            layer: get_layer(
-                layer,
-                **base_kwargs,
-                **(kwargs if type(kwargs) == dict else {})
+            layer: _cached_layer(
+                layer, query, radius,
+                base_kwargs,
+                kwargs if type(kwargs) == dict else {},
+                cache = cache
             )
             for layer, kwargs in layers.items()
         }
@@ -215,36 +418,36 @@ def plot(
 
     # Plot background
     if 'background' in drawing_kwargs:
-        xmin, ymin, xmax, ymax = layers['perimeter'].bounds
-        geom = scale(Polygon([
-            (xmin, ymin),
-            (xmin, ymax),
-            (xmax, ymax),
-            (xmax, ymin)
-        ]), 2, 2)
+        # Perimeter bounding box, scaled 2x around its center
+        xmin, ymin, xmax, ymax = get_bounds(layers['perimeter'])
+        dx, dy = xmax-xmin, ymax-ymin
+        geom = box(xmin-dx/2, ymin-dy/2, xmax+dx/2, ymax+dy/2)
 
         if vsketch is None:
-            ax.add_patch(PolygonPatch(geom, **drawing_kwargs['background']))
+            ax.add_collection(get_collection([geom], **drawing_kwargs['background']))
         else:
             vsketch.geometry(geom)
     
     # Adjust bounds
-    xmin, ymin, xmax, ymax = layers['perimeter'].buffer(max_dilation).bounds
+    xmin, ymin, xmax, ymax = get_bounds(layers['perimeter'] if max_dilation == 0 else layers['perimeter'].buffer(max_dilation))
     dx, dy = xmax-xmin, ymax-ymin
     if vsketch is None:
         ax.set_xlim(xmin, xmax)
         ax.set_ylim(ymin, ymax)
 
+    # Prepare each layer's drawing kwargs once, outside of the draw loop
+    layer_passes = {
+        layer: get_drawing_passes(kwargs, vsketch = vsketch)
+        for layer, kwargs in drawing_kwargs.items()
+    }
+
     # Draw layers
     for layer, shapes in layers.items():
-        kwargs = drawing_kwargs[layer] if layer in drawing_kwargs else {}
-        if 'hatch_c' in kwargs:
-            # Draw hatched shape
-            plot_shapes(shapes, ax, vsketch = vsketch, lw = 0, ec = kwargs['hatch_c'], **{k:v for k,v in kwargs.items() if k not in ['lw', 'ec', 'hatch_c']})
-            # Draw shape contour only
-            plot_shapes(shapes, ax, vsketch = vsketch, fill = False, **{k:v for k,v in kwargs.items() if k not in ['hatch_c', 'hatch', 'fill']})
-        else:
-            # Draw shape normally
+        passes = layer_passes[layer] if layer in layer_passes else [{}]
+        # Flatten shapes once when drawing them in several passes
+        if (len(passes) > 1) and (vsketch is None):
+            shapes = get_polygons(shapes)
+        for kwargs in passes:
             plot_shapes(shapes, ax, vsketch = vsketch, **kwargs)
 
     if ((isinstance(osm_credit, dict)) or (osm_credit is True)) and (vsketch is None):
@@ -0,0 +1,64 @@
+# Fast (Numba-compiled) geometry helpers for postprocessing layers
+# Optional module: install numba to compile them, otherwise they run as plain Python
+
+# Numpy
+import numpy as np
+
+# Shapely
+import shapely
+
+# Numba (optional)
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        return args[0] if len(args) == 1 and callable(args[0]) else (lambda f: f)
+
+# Ray casting: is point (px, py) inside the ring with vertices (xs, ys)?
+@njit(cache = True, fastmath = True)
+def point_in_ring(px, py, xs, ys):
+    inside = False
+    j = len(xs) - 1
+    for i in range(len(xs)):
+        if ((ys[i] > py) != (ys[j] > py)) and (px < (xs[j] - xs[i]) * (py - ys[i]) / (ys[j] - ys[i]) + xs[i]):
+            inside = not inside
+        j = i
+    return inside
+
+# Area of the ring with vertices (xs, ys) (shoelace formula)
+@njit(cache = True, fastmath = True)
+def ring_area(xs, ys):
+    area = 0.
+    j = len(xs) - 1
+    for i in range(len(xs)):
+        area += (xs[j] + xs[i]) * (ys[j] - ys[i])
+        j = i
+    return abs(area) / 2
+
+# Even-odd rule over all rings: valid (Multi)Polygons never overlap, so crossing parity is containment
+@njit(cache = True)
+def rings_contain(px, py, xs, ys, offsets):
+    result = np.zeros(len(px), dtype = np.bool_)
+    for p in range(len(px)):
+        inside = False
+        for r in range(len(offsets) - 1):
+            a, b = offsets[r], offsets[r + 1]
+            if point_in_ring(px[p], py[p], xs[a:b], ys[a:b]):
+                inside = not inside
+        result[p] = inside
+    return result
+
+def contains_batch(geometry, points):
+    '''
+    Test which points (array of shape (n, 2)) lie inside a shapely (Multi)Polygon
+    '''
+    points = np.asarray(points, dtype = float).reshape(-1, 2)
+    # Split geometry into its rings, as flat coordinate arrays + offsets
+    rings = shapely.get_rings(shapely.get_parts(np.asarray([geometry], dtype = object)))
+    offsets = np.concatenate([[0], np.cumsum(shapely.get_num_coordinates(rings))])
+    coords = shapely.get_coordinates(rings)
+    return rings_contain(
+        np.ascontiguousarray(points[:, 0]), np.ascontiguousarray(points[:, 1]),
+        np.ascontiguousarray(coords[:, 0]), np.ascontiguousarray(coords[:, 1]),
+        offsets
+    )
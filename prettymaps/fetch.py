@@ -7,6 +7,7 @@ import osmnx as ox
 import numpy as np
 
 # Shapely
+import shapely
 from shapely.geometry import *
 from shapely.affinity import *
 from shapely.ops import unary_union
@@ -24,6 +25,16 @@ from descartes import PolygonPatch
 
 from functools import reduce
 
+# Whether shapely's vectorized (GEOS ufunc) API is available
+_shapely2 = int(shapely.__version__.split('.')[0]) >= 2
+
+# Union of all geometries in a GeoSeries
+def get_union(geometry):
+    if _shapely2:
+        return shapely.unary_union(np.asarray(geometry.values))
+    else:
+        return unary_union(geometry)
+
 # Compute circular or square boundary given point, radius and crs
 def get_boundary(point, radius, crs, circle = True, dilate = 0):
     if circle:
@@ -48,11 +59,12 @@ def get_geometries(perimeter = None, point = None, radius = None, tags = {}, per
 
     if perimeter is not None:
         # Boundary defined by polygon (perimeter)
+        polygon = get_union(perimeter.geometry)
         geometries = ox.geometries_from_polygon(
-            unary_union(perimeter.geometry).buffer(perimeter_tolerance) if perimeter_tolerance > 0 else unary_union(perimeter.geometry),
+            polygon.buffer(perimeter_tolerance) if perimeter_tolerance > 0 else polygon,
             tags = {tags: True} if type(tags) == str else tags
         )
-        perimeter = unary_union(ox.project_gdf(perimeter).geometry)
+        perimeter = get_union(ox.project_gdf(perimeter).geometry)
 
     elif (point is not None) and (radius is not None):
         # Boundary defined by circle with radius 'radius' around point
@@ -64,18 +76,24 @@ def get_geometries(perimeter = None, point = None, radius = None, tags = {}, per
         geometries = ox.project_gdf(geometries)
 
     # Intersect with perimeter
-    geometries = geometries.intersection(perimeter)
-
-    if union:
-        geometries = unary_union(reduce(lambda x,y: x+y, [
-            [x] if type(x) == Polygon else list(x)
-            for x in geometries if type(x) in [Polygon, MultiPolygon]
-        ], []))
+    if _shapely2:
+        geometries = shapely.intersection(np.asarray(geometries.geometry.values), perimeter)
     else:
-        geometries = MultiPolygon(reduce(lambda x,y: x+y, [
+        geometries = geometries.intersection(perimeter)
+
+    # Keep polygons only & explode MultiPolygons into their parts
+    if _shapely2:
+        type_ids = shapely.get_type_id(geometries)
+        polygons = shapely.get_parts(geometries[(type_ids == 3) | (type_ids == 6)])
+        # Geometries lying outside the perimeter intersect to empty polygons
+        polygons = polygons[~shapely.is_empty(polygons)]
+        geometries = shapely.unary_union(polygons) if union else shapely.multipolygons(polygons)
+    else:
+        polygons = reduce(lambda x,y: x+y, [
             [x] if type(x) == Polygon else list(x)
             for x in geometries if type(x) in [Polygon, MultiPolygon]
-        ], []))
+        ], [])
+        geometries = unary_union(polygons) if union else MultiPolygon(polygons)
 
     return geometries
 
@@ -88,7 +106,7 @@ def get_streets(perimeter = None, point = None, radius = None, layer = 'streets'
     # Boundary defined by polygon (perimeter)
     if perimeter is not None:
         # Fetch streets data, project & convert to GDF
-        streets = ox.graph_from_polygon(unary_union(perimeter.geometry), custom_filter = custom_filter)
+        streets = ox.graph_from_polygon(get_union(perimeter.geometry), custom_filter = custom_filter)
         streets = ox.project_graph(streets)
         streets = ox.graph_to_gdfs(streets, nodes = False)
     # Boundary defined by polygon (perimeter)
@@ -103,9 +121,23 @@ def get_streets(perimeter = None, point = None, radius = None, layer = 'streets'
         streets = ox.graph_to_gdfs(streets, nodes = False)
         # Intersect with perimeter & filter empty elements
         streets.geometry = streets.geometry.intersection(perimeter)
-        streets = streets[~streets.geometry.is_empty]
-
-    if type(width) == dict:
+        if _shapely2:
+            streets = streets.iloc[~shapely.is_empty(np.asarray(streets.geometry.values))]
+        else:
+            streets = streets[~streets.geometry.is_empty]
+
+    if (type(width) == dict) and _shapely2:
+        # Explode all MultiLineStrings at once, keeping track of each line's highway type
+        geometries = np.asarray(streets.geometry.values)
+        lines = shapely.get_parts(geometries)
+        highways = np.repeat(streets[layer].values, shapely.get_num_geometries(geometries))
+        is_line = shapely.get_type_id(lines) == 1
+        streets = shapely.unary_union([
+            # Dilate streets of each highway type == 'highway' using width 'w'
+            shapely.buffer(shapely.multilinestrings(lines[(highways == highway) & is_line]), w)
+            for highway, w in width.items()
+        ])
+    elif type(width) == dict:
         streets = unary_union([
             # Dilate streets of each highway type == 'highway' using width 'w'
             MultiLineString(
@@ -129,13 +161,12 @@ def get_layer(layer, **kwargs):
     if layer == 'perimeter':
         # If perimeter is already provided:
         if 'perimeter' in kwargs:
-            return unary_union(ox.project_gdf(kwargs['perimeter']).geometry)
+            return get_union(ox.project_gdf(kwargs['perimeter']).geometry)
         # If point and radius are provided:
         elif 'point' in kwargs and 'radius' in kwargs:
-            # Dummy request to fetch CRS
-            crs = ox.graph_to_gdfs(ox.graph_from_point(kwargs['point'], dist = kwargs['radius']), nodes = False).crs
+            # Point is given in lat/lng, i.e. the CRS of unprojected OSM data (no need to fetch anything)
             perimeter = get_boundary(
-                kwargs['point'], kwargs['radius'], crs,
+                kwargs['point'], kwargs['radius'], ox.settings.default_crs,
                 **{x: kwargs[x] for x in ['circle', 'dilate'] if x in kwargs.keys()}
             )
             return perimeter
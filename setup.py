@@ -15,6 +15,10 @@ setup(
         'jupyter==1.0.0',
         #'vsketch==1.0.0'
     ],
+    extras_require={
+        # Compiled helpers in prettymaps.fastgeom
+        'fast': ['numba'],
+    },
 
     classifiers=[
         'Intended Audience :: Science/Research',